@@ -0,0 +1,49 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that keeps the COUNT(*) of its queryset on Django's cache,
+    keyed by the query SQL and params (per-user filters are part of the params)
+    """
+    timeout = 300
+    refresh = False
+    
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super(CachedCountPaginator, self).count
+        try:
+            sql, params = query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        query_hash = hashlib.md5(('%s %r' % (sql, params)).encode('utf8')).hexdigest()
+        key = 'api.count:%s' % query_hash
+        count = None if self.refresh else cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.timeout)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    Only paginates when REST_FRAMEWORK PAGE_SIZE is configured,
+    the first page always refreshes the cached count
+    """
+    def django_paginator_class(self, *args, **kwargs):
+        paginator = CachedCountPaginator(*args, **kwargs)
+        paginator.refresh = self.refresh_count
+        return paginator
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        page_number = request.query_params.get(self.page_query_param, 1)
+        self.refresh_count = str(page_number) == '1'
+        return super(CachedCountPagination, self).paginate_queryset(queryset, request, view=view)
@@ -1,6 +1,6 @@
 import copy
 
-from .models import Domain, Record
+from .models import Record
 
 
 def domain_for_validation(instance, records):
@@ -9,6 +9,8 @@ def domain_for_validation(instance, records):
     so when validation calls render_zone() it will use the new provided data
     """
     domain = copy.copy(instance)
+    domain.cache_zone = False
+    domain.__dict__.pop('_records_cache', None)
     def get_declared_records(records=records):
         for data in records:
             yield Record(type=data['type'], value=data['value'])
@@ -19,13 +21,14 @@ def domain_for_validation(instance, records):
         domain.top = domain.get_parent(top=True)
     if domain.top:
         # is a subdomain
+        domain.top.cache_zone = False
         subdomains = domain.top.subdomains.select_related('top').prefetch_related('records').all()
         subdomains = [sub for sub in subdomains if sub.pk != domain.pk]
         domain.top.get_subdomains = lambda: subdomains + [domain]
     elif not domain.pk:
         # is a new top domain
         subdomains = []
-        for subdomain in Domain.objects.filter(name__endswith='.%s' % domain.name):
+        for subdomain in domain.subdomains:
             subdomain.top = domain
             subdomains.append(subdomain)
         domain.get_subdomains = lambda: subdomains
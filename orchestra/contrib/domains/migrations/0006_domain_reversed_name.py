@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def reverse_names(apps, schema_editor):
+    Domain = apps.get_model('domains', 'Domain')
+    for domain in Domain.objects.only('pk', 'name'):
+        reversed_name = '.'.join(reversed(domain.name.split('.')))
+        Domain.objects.filter(pk=domain.pk).update(reversed_name=reversed_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0005_auto_20160219_1034'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='domain',
+            name='reversed_name',
+            field=models.CharField(max_length=256, db_index=True, editable=False, verbose_name='reversed name', default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(reverse_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domains', '0006_domain_reversed_name'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='record',
+            index_together=set([('domain', 'type')]),
+        ),
+    ]
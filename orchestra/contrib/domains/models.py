@@ -1,9 +1,11 @@
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import signals
+from django.db.models.functions import Length
 from django.utils.translation import ungettext, ugettext_lazy as _
 
 from orchestra.core.validators import validate_ipv4_address, validate_ipv6_address, validate_ascii
-from orchestra.utils.python import AttrDict
 
 from . import settings, validators, utils
 
@@ -12,15 +14,38 @@ class DomainQuerySet(models.QuerySet):
     def get_parent(self, name, top=False):
         """ get the next domain on the chain """
         split = name.split('.')
+        # candidates sorted from the closest to the farthest parent
+        candidates = ['.'.join(split[i:]) for i in range(1, len(split)-1)]
+        if not candidates:
+            return None
+        # Full rows, not only(): the returned domain becomes self.top, whose serial and
+        # SOA fields are read right away by the zone cache and render_zone()
+        matches = {
+            domain.name: domain for domain in Domain.objects.filter(name__in=candidates)
+        }
         parent = None
-        for i in range(1, len(split)-1):
-            name = '.'.join(split[i:])
-            domain = Domain.objects.filter(name=name)
-            if domain:
-                parent = domain.get()
+        for candidate in candidates:
+            domain = matches.get(candidate)
+            if domain is not None:
+                parent = domain
                 if not top:
                     return parent
         return parent
+    
+    def zone_subdomains(self):
+        """ subdomains with their records, as rendered by Domain.render_zone() """
+        qs = self.prefetch_related('records')
+        # longest names first, as required by wildcard rendering on render_zone()
+        qs = qs.annotate(name_len=Length('name'))
+        return qs.order_by('-name_len', 'name')
+    
+    def with_zone_data(self):
+        """ prefetches all render_zone() data, queries do not grow with the number of domains """
+        subdomains = Domain.objects.zone_subdomains()
+        return self.prefetch_related(
+            'records',
+            models.Prefetch('subdomain_set', queryset=subdomains),
+        )
 
 
 class Domain(models.Model):
@@ -32,6 +57,8 @@ class Domain(models.Model):
         ])
     account = models.ForeignKey('accounts.Account', verbose_name=_("Account"), blank=True,
         related_name='domains', help_text=_("Automatically selected for subdomains."))
+    reversed_name = models.CharField(_("reversed name"), max_length=256, db_index=True,
+        editable=False)
     top = models.ForeignKey('domains.Domain', null=True, related_name='subdomain_set',
         editable=False, verbose_name=_("top domain"))
     serial = models.IntegerField(_("serial"), default=utils.generate_zone_serial, editable=False,
@@ -67,6 +94,8 @@ class Domain(models.Model):
                     "The default value is <tt>%s</tt>.") % settings.DOMAINS_DEFAULT_MIN_TTL)
     
     objects = DomainQuerySet.as_manager()
+    # disabled by helpers.domain_for_validation(), its records are not on the database
+    cache_zone = True
     
     def __str__(self):
         return self.name
@@ -85,13 +114,15 @@ class Domain(models.Model):
     
     @property
     def subdomains(self):
-        return Domain.objects.filter(name__regex='\.%s$' % self.name)
+        reversed_name = utils.reverse_domain_name(self.name)
+        return Domain.objects.filter(reversed_name__startswith='%s.' % reversed_name)
     
     def clean(self):
         self.name = self.name.lower()
     
     def save(self, *args, **kwargs):
         """ create top relation """
+        self.reversed_name = utils.reverse_domain_name(self.name)
         update = False
         if not self.pk:
             top = self.get_parent(top=True)
@@ -101,15 +132,31 @@ class Domain(models.Model):
             else:
                 update = True
         super(Domain, self).save(*args, **kwargs)
+        self.clear_zone_cache()
         if update:
-            for domain in self.subdomains.exclude(pk=self.pk):
-                # queryset.update() is not used because we want to trigger backend to delete ex-topdomains
-                domain.top = self
-                domain.save(update_fields=('top',))
+            using = self._state.db
+            update_fields = frozenset(('top',))
+            with transaction.atomic(using=using):
+                subdomains = list(self.subdomains.using(using).exclude(pk=self.pk))
+                # signals are sent because we want to trigger backend to delete ex-topdomains,
+                # with the same arguments and order as save() would
+                for domain in subdomains:
+                    domain.top = self
+                    signals.pre_save.send(sender=Domain, instance=domain, raw=False,
+                        using=using, update_fields=update_fields)
+                Domain.objects.using(using).filter(pk__in=[d.pk for d in subdomains]).update(top=self)
+                for domain in subdomains:
+                    signals.post_save.send(sender=Domain, instance=domain, created=False,
+                        raw=False, using=using, update_fields=update_fields)
+    
+    def delete(self, *args, **kwargs):
+        self.clear_zone_cache()
+        super(Domain, self).delete(*args, **kwargs)
     
     def get_description(self):
         if self.is_top:
-            num = self.subdomains.count()
+            # equivalent to subdomains for top domains, but indexed and prefetch-aware
+            num = self.subdomain_set.count()
             return ungettext(
                 _("top domain with one subdomain"),
                 _("top domain with %d subdomains") % num,
@@ -121,40 +168,101 @@ class Domain(models.Model):
     
     def get_declared_records(self):
         """ proxy method, needed for input validation, see helpers.domain_for_validation """
+        # no further filtering, it would bypass get_subdomains() prefetched records
         return self.records.all()
     
     def get_subdomains(self):
         """ proxy method, needed for input validation, see helpers.domain_for_validation """
-        return self.origin.subdomain_set.all().prefetch_related('records')
+        origin = self.origin
+        if 'subdomain_set' in getattr(origin, '_prefetched_objects_cache', {}):
+            # prefetched by DomainQuerySet.with_zone_data()
+            return origin.subdomain_set.all()
+        return origin.subdomain_set.all().zone_subdomains()
     
     def get_parent(self, top=False):
         return type(self).objects.get_parent(self.name, top=top)
     
+    def get_zone_cache_key(self, serial=None):
+        """ keyed on the DB origin serial unless provided, related top instances can be stale """
+        origin_id = self.top_id or self.pk
+        if serial is None:
+            serial = Domain.objects.filter(pk=origin_id).values_list('serial', flat=True).first()
+            if serial is None:
+                return None
+        return 'domains.zone:%i:%i' % (origin_id, serial)
+    
+    def clear_zone_cache(self):
+        self.__dict__.pop('_records_cache', None)
+        if self.pk and settings.DOMAINS_ZONE_CACHE_TIMEOUT:
+            key = self.get_zone_cache_key()
+            if key:
+                cache.delete(key)
+    
     def render_zone(self):
+        """ zone rendering is cached until the origin serial changes """
         origin = self.origin
-        zone = origin.render_records()
+        timeout = settings.DOMAINS_ZONE_CACHE_TIMEOUT
+        if not timeout or not origin.pk or not (self.cache_zone and origin.cache_zone):
+            return self._render_zone()
+        key = self.get_zone_cache_key()
+        if key != self.get_zone_cache_key(serial=origin.serial):
+            # stale origin instance, its SOA serial is not the one on the DB
+            return self._render_zone()
+        return cache.get_or_set(key, self._render_zone, timeout)
+    
+    def _render_zone(self):
+        return ''.join(self.iter_zone()).strip()
+    
+    def iter_zone(self, chunk_size=500):
+        """
+        Yields the zone file domain by domain,
+        only chunk_size subdomains are kept in memory when they come from the database
+        """
+        origin = self.origin
+        yield origin.render_records()
         tail = []
-        for subdomain in origin.get_subdomains():
+        for subdomain in self.iter_subdomains(origin.get_subdomains(), chunk_size):
             if subdomain.name.startswith('*'):
                 # This subdomains needs to be rendered last in order to avoid undesired matches
                 tail.append(subdomain)
             else:
-                zone += subdomain.render_records()
+                yield subdomain.render_records()
+        # tail is already sorted by get_subdomains(), this is a linear pass on sorted input,
+        # kept for helpers.domain_for_validation() which provides unsorted subdomains
         for subdomain in sorted(tail, key=lambda x: len(x.name), reverse=True):
-            zone += subdomain.render_records()
-        return zone.strip()
+            yield subdomain.render_records()
+    
+    def iter_subdomains(self, subdomains, chunk_size):
+        if not isinstance(subdomains, models.QuerySet) or subdomains._result_cache is not None:
+            # helpers.domain_for_validation() lists or prefetched by with_zone_data()
+            yield from subdomains
+            return
+        # iterator() ignores prefetch_related(), records are prefetched chunk by chunk
+        chunk = []
+        for subdomain in subdomains.iterator():
+            chunk.append(subdomain)
+            if len(chunk) == chunk_size:
+                models.prefetch_related_objects(chunk, 'records')
+                yield from chunk
+                chunk = []
+        if chunk:
+            models.prefetch_related_objects(chunk, 'records')
+            yield from chunk
     
     def refresh_serial(self):
         """ Increases the domain serial number by one """
         serial = utils.generate_zone_serial()
         if serial <= self.serial:
-            num = int(str(self.serial)[8:]) + 1
+            # YYYYMMDDNN
+            date, num = divmod(self.serial, 100)
+            num += 1
             if num >= 99:
                 raise ValueError('No more serial numbers for today')
-            serial = str(self.serial)[:8] + '%.2d' % num
-            serial = int(serial)
+            serial = date*100 + num
+        self.clear_zone_cache()
         self.serial = serial
-        self.save(update_fields=('serial',))
+        # save() is not used, only the serial changes and it is ignored by backends
+        Domain.objects.filter(pk=self.pk).update(serial=serial)
     
     def get_default_soa(self):
         return ' '.join([
@@ -171,29 +279,29 @@ class Domain(models.Model):
         defaults = []
         if self.is_top:
             for ns in settings.DOMAINS_DEFAULT_NS:
-                defaults.append(AttrDict(
+                defaults.append(utils.ZoneRecord(
                     type=Record.NS,
                     value=ns
                 ))
             soa = self.get_default_soa()
-            defaults.insert(0, AttrDict(
+            defaults.insert(0, utils.ZoneRecord(
                 type=Record.SOA,
                 value=soa
             ))
         for mx in settings.DOMAINS_DEFAULT_MX:
-            defaults.append(AttrDict(
+            defaults.append(utils.ZoneRecord(
                 type=Record.MX,
                 value=mx
             ))
         default_a = settings.DOMAINS_DEFAULT_A
         if default_a:
-            defaults.append(AttrDict(
+            defaults.append(utils.ZoneRecord(
                 type=Record.A,
                 value=default_a
             ))
         default_aaaa = settings.DOMAINS_DEFAULT_AAAA
         if default_aaaa:
-            defaults.append(AttrDict(
+            defaults.append(utils.ZoneRecord(
                 type=Record.AAAA,
                 value=default_aaaa
             ))
@@ -219,23 +327,34 @@ class Domain(models.Model):
         return False
     
     def get_records(self):
+        """ memoized on the instance, SOA record depends on the current serial """
+        cached = self.__dict__.get('_records_cache')
+        if cached is not None and cached[0] == self.serial:
+            return cached[1]
+        records = self._get_records()
+        self._records_cache = (self.serial, records)
+        return records
+    
+    def _get_records(self):
         types = set()
         records = utils.RecordStorage()
+        # same as Record.get_ttl(), without the settings lookup per record
+        default_ttl = settings.DOMAINS_DEFAULT_TTL
         for record in self.get_declared_records():
             types.add(record.type)
             if record.type == record.SOA:
                 # Update serial and insert at 0
                 value = record.value.split()
                 value[2] = str(self.serial)
-                records.insert(0, AttrDict(
+                records.insert(0, utils.ZoneRecord(
                     type=record.SOA,
-                    ttl=record.get_ttl(),
+                    ttl=record.ttl or default_ttl,
                     value=' '.join(value)
                 ))
             else:
-                records.append(AttrDict(
+                records.append(utils.ZoneRecord(
                     type=record.type,
-                    ttl=record.get_ttl(),
+                    ttl=record.ttl or default_ttl,
                     value=record.value
                 ))
         for record in self.get_default_records():
@@ -247,35 +366,35 @@ class Domain(models.Model):
         return records
     
     def render_records(self):
-        result = ''
+        # name and default TTL are the same for all the records
+        name = ('%s.' % self.name).ljust(38)
+        default_ttl = settings.DOMAINS_DEFAULT_TTL
+        result = []
         for record in self.get_records():
-            name = '{name}.{spaces}'.format(
-                name=self.name,
-                spaces=' ' * (37-len(self.name))
-            )
-            ttl = record.get('ttl', settings.DOMAINS_DEFAULT_TTL)
-            ttl = '{spaces}{ttl}'.format(
-                spaces=' ' * (7-len(ttl)),
-                ttl=ttl
-            )
-            type = '{type} {spaces}'.format(
-                type=record.type,
-                spaces=' ' * (7-len(record.type))
-            )
-            result += '{name} {ttl} IN {type} {value}\n'.format(
-                name=name,
-                ttl=ttl,
-                type=type,
-                value=record.value
-            )
-        return result
+            ttl = record.get('ttl', default_ttl)
+            result.append('%s %s IN %s  %s\n' % (
+                name, ttl.rjust(7), record.type.ljust(7), record.value
+            ))
+        return ''.join(result)
     
     def has_default_mx(self):
-        records = self.get_records()
-        for record in records.by_type('MX'):
-            for default in settings.DOMAINS_DEFAULT_MX:
-                if record.value.endswith(' %s' % default.split()[-1]):
-                    return True
+        """ only declared types and MX values are needed, full get_records() is avoided """
+        types = set()
+        mx_values = []
+        for type, value in self.records.values_list('type', 'value'):
+            types.add(type)
+            if type == Record.MX:
+                mx_values.append(value)
+        if not mx_values:
+            # default MX records are only used when they are implicit
+            default_mx = utils.ZoneRecord(type=Record.MX)
+            return bool(settings.DOMAINS_DEFAULT_MX) and self.record_is_implicit(default_mx, types)
+        default_hosts = {default.split()[-1] for default in settings.DOMAINS_DEFAULT_MX}
+        for value in mx_values:
+            # i.e. '10 mail.orchestra.lan.'
+            value = value.rsplit(' ', 1)
+            if len(value) == 2 and value[1] in default_hosts:
+                return True
         return False
 
 
@@ -322,6 +441,12 @@ class Record(models.Model):
     value = models.CharField(_("value"), max_length=256,
         help_text=_("MX, NS and CNAME records sould end with a dot."))
     
+    class Meta:
+        # zone rendering and has_default_mx() filter by domain and type
+        index_together = (
+            ('domain', 'type'),
+        )
+    
     def __str__(self):
         return "%s %s IN %s %s" % (self.domain, self.get_ttl(), self.type, self.value)
     
@@ -330,14 +455,21 @@ class Record(models.Model):
         # validate value
         if self.type != self.TXT:
             self.value = self.value.lower().strip()
-        if self.type:
-            for validator in self.VALIDATORS.get(self.type, []):
-                try:
-                    validator(self.value)
-                except ValidationError as error:
-                    raise ValidationError({
-                        'value': error,
-                    })
+        for validator in self.VALIDATORS.get(self.type, ()):
+            try:
+                validator(self.value)
+            except ValidationError as error:
+                raise ValidationError({
+                    'value': error,
+                })
+    
+    def save(self, *args, **kwargs):
+        super(Record, self).save(*args, **kwargs)
+        self.domain.clear_zone_cache()
+    
+    def delete(self, *args, **kwargs):
+        super(Record, self).delete(*args, **kwargs)
+        self.domain.clear_zone_cache()
     
     def get_ttl(self):
         return self.ttl or settings.DOMAINS_DEFAULT_TTL
@@ -122,3 +122,12 @@ DOMAINS_MASTERS = Setting('DOMAINS_MASTERS',
     validators=[lambda masters: list(map(validate_ip_address, masters))],
     help_text="Additional master server ip addresses other than autodiscovered by router.get_servers()."
 )
+
+
+DOMAINS_ZONE_CACHE_TIMEOUT = Setting('DOMAINS_ZONE_CACHE_TIMEOUT',
+    0,
+    help_text="Seconds a rendered zone is kept on Django's cache, keyed by origin and serial. "
+              "<tt>0</tt> disables zone caching. Only zone views benefit, backends refresh the "
+              "serial before rendering, and changes made through queryset updates or deletes "
+              "are not invalidated. Use a cache shared by all processes."
+)
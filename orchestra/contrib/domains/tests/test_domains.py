@@ -1,6 +1,11 @@
+from unittest.mock import patch
+
+from django.db.models import signals
+
 from orchestra.utils.tests import BaseTestCase
 
-from ..models import Domain
+from .. import settings
+from ..models import Domain, Record
 
 
 class DomainTest(BaseTestCase):
@@ -16,3 +21,94 @@ class DomainTest(BaseTestCase):
         domain = Domain.objects.create(name='rostrepalid.org', account=account)
         domain.render_zone()
 
+    
+    def test_get_parent(self):
+        account = self.create_account()
+        top = Domain.objects.create(name='rostrepalid.org', account=account)
+        sub = Domain.objects.create(name='mail.rostrepalid.org')
+        self.assertEqual(sub, Domain.objects.get_parent('www.mail.rostrepalid.org'))
+        self.assertEqual(top, Domain.objects.get_parent('www.mail.rostrepalid.org', top=True))
+        self.assertIsNone(Domain.objects.get_parent('rostrepalid.org'))
+    
+    def test_refresh_serial(self):
+        account = self.create_account()
+        domain = Domain.objects.create(name='rostrepalid.org', account=account)
+        serial = domain.serial
+        domain.refresh_serial()
+        self.assertEqual(serial+1, domain.serial)
+        self.assertEqual(domain.serial, Domain.objects.get(pk=domain.pk).serial)
+    
+    @patch.object(settings, 'DOMAINS_ZONE_CACHE_TIMEOUT', 3600)
+    def test_render_zone_after_refresh_serial(self):
+        account = self.create_account()
+        top = Domain.objects.create(name='rostrepalid.org', account=account)
+        sub = Domain.objects.create(name='www.rostrepalid.org')
+        # sub.top is kept in memory with the old serial
+        sub.top
+        top.refresh_serial()
+        Domain.objects.get(pk=top.pk).render_zone()
+        Record.objects.create(domain=sub, type=Record.AAAA, value='::1')
+        self.assertIn('::1', Domain.objects.get(pk=top.pk).render_zone())
+    
+    def test_subdomains(self):
+        account = self.create_account()
+        domain = Domain.objects.create(name='example.org', account=account)
+        sub = Domain.objects.create(name='a.b.example.org')
+        Domain.objects.create(name='wwwexample.org', account=account)
+        self.assertEqual([sub], list(domain.subdomains))
+    
+    def test_reversed_name(self):
+        account = self.create_account()
+        domain = Domain.objects.create(name='www.example.org', account=account)
+        self.assertEqual('org.example.www', domain.reversed_name)
+        domain.name = 'mail.example.org'
+        domain.save()
+        self.assertEqual('org.example.mail', Domain.objects.get(pk=domain.pk).reversed_name)
+    
+    def test_with_zone_data(self):
+        account = self.create_account()
+        for name in ('rostrepalid.org', 'orchestra.lan'):
+            Domain.objects.create(name=name, account=account)
+            for prefix in ('www', 'mail'):
+                sub = Domain.objects.create(name='%s.%s' % (prefix, name))
+                Record.objects.create(domain=sub, type=Record.A, value='127.0.0.1')
+        # domains, top records, subdomains and subdomain records
+        with self.assertNumQueries(4):
+            zones = [
+                domain.render_zone()
+                for domain in Domain.objects.filter(top__isnull=True).with_zone_data()
+            ]
+        self.assertEqual(2, len(zones))
+        for zone in zones:
+            self.assertEqual(2, zone.count('127.0.0.1'))
+    
+    def test_iter_zone_chunks(self):
+        account = self.create_account()
+        domain = Domain.objects.create(name='rostrepalid.org', account=account)
+        names = ('*.rostrepalid.org', 'a.rostrepalid.org', 'bb.rostrepalid.org', 'ccc.rostrepalid.org')
+        for ix, name in enumerate(names):
+            sub = Domain.objects.create(name=name)
+            Record.objects.create(domain=sub, type=Record.A, value='10.0.0.%i' % ix)
+        zone = ''.join(domain.iter_zone(chunk_size=2))
+        positions = [zone.index('10.0.0.%i\n' % ix) for ix in range(len(names))]
+        # wildcard subdomains are rendered last
+        self.assertEqual(positions[0], max(positions))
+    
+    def test_top_reassignment_signals(self):
+        account = self.create_account()
+        subs = [
+            Domain.objects.create(name=name, account=account)
+            for name in ('www.rostrepalid.org', 'mail.rostrepalid.org')
+        ]
+        updated = []
+        def receiver(sender, instance, created, update_fields, **kwargs):
+            if not created:
+                updated.append((instance.pk, update_fields))
+        signals.post_save.connect(receiver, sender=Domain)
+        try:
+            domain = Domain.objects.create(name='rostrepalid.org', account=account)
+        finally:
+            signals.post_save.disconnect(receiver, sender=Domain)
+        self.assertEqual(sorted((sub.pk, {'top'}) for sub in subs), sorted(updated))
+        for sub in subs:
+            self.assertEqual(domain, Domain.objects.get(pk=sub.pk).top)
@@ -3,6 +3,25 @@ from collections import defaultdict
 from django.utils import timezone
 
 
+class ZoneRecord(object):
+    """
+    Lightweight record used for zone rendering, far smaller than a dict per record
+    """
+    __slots__ = ('type', 'ttl', 'value')
+    
+    def __init__(self, type, ttl=None, value=None):
+        self.type = type
+        self.ttl = ttl
+        self.value = value
+    
+    def __repr__(self):
+        return 'ZoneRecord(%r, %r, %r)' % (self.type, self.ttl, self.value)
+    
+    def get(self, attr, default=None):
+        value = getattr(self, attr, None)
+        return default if value is None else value
+
+
 class RecordStorage(object):
     """
     list-dict implementation for fast lookups of record types
@@ -17,16 +36,21 @@ class RecordStorage(object):
     
     def append(self, record):
         self.records.append(record)
-        self.type[record['type']].append(record)
+        self.type[record.type].append(record)
     
     def insert(self, ix, record):
         self.records.insert(ix, record)
-        self.type[record['type']].insert(ix, record)
+        self.type[record.type].insert(ix, record)
     
     def by_type(self, type):
         return self.type[type]
 
 
+def reverse_domain_name(name):
+    """ www.example.com -> com.example.www, makes subdomain lookups index friendly """
+    return '.'.join(reversed(name.split('.')))
+
+
 def generate_zone_serial():
     today = timezone.now()
     return int("%.4d%.2d%.2d%.2d" % (today.year, today.month, today.day, 0))
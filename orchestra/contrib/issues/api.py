@@ -1,10 +1,12 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets, mixins
 from rest_framework.decorators import detail_route
 from rest_framework.response import Response
 
 from orchestra.api import router, LogApiMixin
+from orchestra.api.pagination import CachedCountPagination
 
-from .models import Ticket, Queue
+from .models import Ticket, Queue, Message, TicketTracker
 from .serializers import TicketSerializer, QueueSerializer
 
 
@@ -12,6 +14,7 @@ from .serializers import TicketSerializer, QueueSerializer
 class TicketViewSet(LogApiMixin, viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    pagination_class = CachedCountPagination
     
     @detail_route()
     def mark_as_read(self, request, pk=None):
@@ -28,7 +31,12 @@ class TicketViewSet(LogApiMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         qs = super(TicketViewSet, self).get_queryset()
         qs = qs.select_related('creator', 'queue')
-        qs = qs.prefetch_related('messages__author')
+        qs = qs.prefetch_related(
+            Prefetch('messages', queryset=Message.objects.select_related('author')),
+            # serializer's is_read lookup, one query for the whole page
+            Prefetch('trackers', to_attr='user_trackers',
+                queryset=TicketTracker.objects.filter(user=self.request.user)),
+        )
         return qs.filter(creator=self.request.user)
 
 
@@ -38,6 +46,7 @@ class QueueViewSet(LogApiMixin,
                    viewsets.GenericViewSet):
     queryset = Queue.objects.all()
     serializer_class = QueueSerializer
+    pagination_class = CachedCountPagination
 
 
 router.register(r'tickets', TicketViewSet)
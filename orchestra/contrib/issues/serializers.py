@@ -38,6 +38,10 @@ class TicketSerializer(serializers.HyperlinkedModelSerializer):
         read_only_fields = ('creator', 'creator_name', 'owner')
     
     def get_is_read(self, obj):
+        trackers = getattr(obj, 'user_trackers', None)
+        if trackers is not None:
+            # prefetched by TicketViewSet.get_queryset()
+            return bool(trackers)
         return obj.is_read_by(self.context['request'].user)
     
     def create(self, validated_data):
@@ -4,8 +4,16 @@ when you run "manage.py test".
 
 Replace this with more appropriate tests for your application.
 """
+import json
 
+from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from orchestra.utils.tests import BaseTestCase
+
+from .models import Ticket, Message
 
 
 class SimpleTest(TestCase):
@@ -14,3 +22,38 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class TicketApiTest(BaseTestCase):
+    def setUp(self):
+        self.account = self.create_account(superuser=True)
+        self.client.login(username=self.account.username, password='orchestra')
+    
+    def create_ticket(self):
+        return Ticket.objects.create(creator=self.account, subject='subject',
+            description='description')
+    
+    def get_tickets(self, **params):
+        response = self.client.get(reverse('ticket-list'), params, HTTP_ACCEPT='application/json')
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content.decode('utf8'))
+    
+    def test_list_queries(self):
+        self.create_ticket()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_tickets()
+        for __ in range(4):
+            ticket = self.create_ticket()
+            Message.objects.create(ticket=ticket, author=self.account, content='content')
+        # messages, authors and trackers are fetched once per page
+        with self.assertNumQueries(len(queries.captured_queries)):
+            self.assertEqual(5, len(self.get_tickets()))
+    
+    def test_is_read(self):
+        read = self.create_ticket()
+        read.mark_as_read_by(self.account)
+        unread = self.create_ticket()
+        is_read = {
+            ticket['id']: ticket['is_read'] for ticket in self.get_tickets()
+        }
+        self.assertEqual({read.pk: True, unread.pk: False}, is_read)
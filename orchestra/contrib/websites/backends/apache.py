@@ -1,8 +1,9 @@
 import os
 import re
 import textwrap
+from collections import defaultdict
+from functools import lru_cache
 
-from django.template import Template, Context
 from django.utils.translation import ugettext_lazy as _
 
 from orchestra.contrib.orchestration import ServiceController
@@ -12,6 +13,154 @@ from .. import settings
 from ..utils import normurlpath
 
 
+# App and wrapper paths repeat for every content of every site on a batch
+_normpath = lru_cache(maxsize=1024)(os.path.normpath)
+_splitpath = lru_cache(maxsize=1024)(os.path.split)
+
+
+# Redirects containing any of these characters are handled by RedirectMatch
+_REDIRECT_REGEX_CHARS = re.compile(r'[\^\*\$\?\)]')
+
+
+_SAVE_CONF_TMPL = textwrap.dedent("""
+    # Generate Apache config for site %(site_name)s
+    cat << 'EOF' > %(sites_available)s.new
+    %(apache_conf)s
+    EOF
+    if diff -N -I'^\s*#' %(sites_available)s %(sites_available)s.new; then
+        rm %(sites_available)s.new
+    else
+        mv %(sites_available)s.new %(sites_available)s
+        UPDATED_APACHE=1
+    fi""")
+
+
+_ENABLE_SITE_TMPL = textwrap.dedent("""
+    # Enable site %(site_name)s
+    [[ $(a2ensite %(site_unique_name)s) =~ "already enabled" ]] || UPDATED_APACHE=1""")
+
+
+_DISABLE_SITE_TMPL = textwrap.dedent("""
+    # Disable site %(site_name)s
+    [[ $(a2dissite %(site_unique_name)s) =~ "already disabled" ]] || UPDATED_APACHE=1""")
+
+
+_DELETE_TMPL = textwrap.dedent("""
+    # Remove site configuration for %(site_name)s
+    [[ $(a2dissite %(site_unique_name)s) =~ "already disabled" ]] || UPDATED_APACHE=1
+    rm -f %(sites_available)s""")
+
+
+_PREPARE_TMPL = textwrap.dedent("""
+    BACKEND="Apache2Controller"
+    echo "$BACKEND" >> /dev/shm/reload.apache2
+
+    function coordinate_apache_reload () {
+        # Coordinate Apache reload with other concurrent backends (e.g. PHPController)
+        is_last=0
+        counter=0
+        while ! mv /dev/shm/reload.apache2 /dev/shm/reload.apache2.locked; do
+            if [[ $counter -gt 4 ]]; then
+                echo "[ERROR]: Apache reload synchronization deadlocked!" >&2
+                exit 10
+            fi
+            counter=$(($counter+1))
+            sleep 0.1;
+        done
+        state="$(grep -v -E "^$BACKEND($|\s)" /dev/shm/reload.apache2.locked)" || is_last=1
+        [[ $is_last -eq 0 ]] && {
+            echo "$state" | grep -v ' RELOAD$' || is_last=1
+        }
+        if [[ $is_last -eq 1 ]]; then
+            echo "[DEBUG]: Last backend to run, update: $UPDATED_APACHE, state: '$state'"
+            if [[ $UPDATED_APACHE -eq 1 || "$state" =~ .*RELOAD$ ]]; then
+                if service apache2 status > /dev/null; then
+                    service apache2 reload
+                else
+                    service apache2 start
+                fi
+            fi
+            rm /dev/shm/reload.apache2.locked
+        else
+            echo "$state" > /dev/shm/reload.apache2.locked
+            if [[ $UPDATED_APACHE -eq 1 ]]; then
+                echo -e "[DEBUG]: Apache will be reloaded by another backend:\\n${state}"
+                echo "$BACKEND RELOAD" >> /dev/shm/reload.apache2.locked
+            fi
+            mv /dev/shm/reload.apache2.locked /dev/shm/reload.apache2
+        fi
+    }""")
+
+
+_MONITOR_TMPL = textwrap.dedent("""\
+    # mawk is considerably faster than gawk on large logs, use it when available
+    AWK=$(command -v mawk || echo awk)
+    function monitor () {
+        OBJECT_ID=$1
+        INI_DATE=$(date "+%%Y%%m%%d%%H%%M%%S" -d "$2")
+        END_DATE=$(date '+%%Y%%m%%d%%H%%M%%S' -d '%(current_date)s')
+        LOG_FILE="$3"
+        {
+            if [[ ! -r "${LOG_FILE}" ]]; then
+                echo 0
+            else
+                ${AWK} -v ini="${INI_DATE}" -v end="${END_DATE}" -v ignore="%(ignore_hosts)s" '
+                    BEGIN {
+                        sum = 0
+                        months = "JanFebMarAprMayJunJulAugSepOctNovDec"
+                        ini_n = ini + 0
+                        end_n = end + 0
+                    } ignore != "" && $0 ~ ignore {
+                        next
+                    } {
+                        # $4 = [11/Jul/2014:13:50:41
+                        month = sprintf("%%02d", (index(months, substr($4, 5, 3)) + 2) / 3)
+                        line_date = (substr($4, 9, 4) month substr($4, 2, 2) \\
+                            substr($4, 14, 2) substr($4, 17, 2) substr($4, 20, 2)) + 0
+                        if ( line_date > ini_n && line_date < end_n)
+                            sum += $NF
+                    } END {
+                        printf "%%.0f\\n", sum
+                    }' "${LOG_FILE}"
+            fi
+        } | xargs echo ${OBJECT_ID}
+    }""")
+
+
+_FCGID_BIN_TMPL = textwrap.dedent("""\
+    Alias /fcgi-bin/ %(wrapper_dir)s/
+    <Location /fcgi-bin/>
+        SetHandler fcgid-script
+        Options +ExecCGI
+    </Location>
+    """)
+
+
+_FCGID_APP_TMPL = textwrap.dedent("""
+    ProxyPass %(location)s/ !
+    <Directory %(app_path)s/>
+        AddHandler php-fcgi .php
+        Action php-fcgi /fcgi-bin/%(wrapper_name)s
+    </Directory>""")
+
+
+_SEC_ENGINE_LOCATION_TMPL = textwrap.dedent("""\
+    <Location %s>
+        SecRuleEngine Off
+    </Location>""")
+
+
+_SECURITY_TMPL = textwrap.dedent("""\
+    <IfModule mod_security2.c>
+        %s
+    </IfModule>""")
+
+
+_PROXY_TMPL = textwrap.dedent("""\
+    ProxyPass {location}/ {target} {options}
+    ProxyPassReverse {location}/ {target}""")
+
+
 class Apache2Controller(ServiceController):
     """
     Apache &ge;2.4 backend with support for the following directives:
@@ -38,152 +187,113 @@ class Apache2Controller(ServiceController):
         'WEBSITES_SAAS_DIRECTIVES',
     ))
     
-    def get_extra_conf(self, site, context, ssl=False):
+    def get_extra_conf_lines(self, site, context, directives, ssl=False):
         extra_conf = self.get_content_directives(site, context)
-        directives = site.get_directives()
         if ssl:
-            extra_conf += self.get_ssl(directives)
-        extra_conf += self.get_security(directives)
-        extra_conf += self.get_redirects(directives)
-        extra_conf += self.get_proxies(directives)
-        extra_conf += self.get_saas(directives)
-        settings_context = site.get_settings_context()
-        for location, directive in settings.WEBSITES_VHOST_EXTRA_DIRECTIVES:
-            extra_conf.append((location, directive % settings_context))
-        # Order extra conf directives based on directives (longer first)
-        extra_conf = sorted(extra_conf, key=lambda a: len(a[0]), reverse=True)
-        return '\n'.join([conf for location, conf in extra_conf])
+            extra_conf.extend(self.get_ssl(directives))
+        extra_conf.extend(self.get_security(directives))
+        extra_conf.extend(self.get_redirects(directives))
+        extra_conf.extend(self.get_proxies(directives))
+        extra_conf.extend(self.get_saas(directives))
+        extra_directives = settings.WEBSITES_VHOST_EXTRA_DIRECTIVES
+        if any('%' in directive for location, directive in extra_directives):
+            settings_context = site.get_settings_context()
+            extra_conf.extend(
+                (location, directive % settings_context if '%' in directive else directive)
+                for location, directive in extra_directives
+            )
+        else:
+            # No placeholders, spare building the settings context
+            extra_conf.extend(extra_directives)
+        # Order extra conf directives based on directives (longer first),
+        # bucketed by location length, keeping the declaration order within each
+        buckets = defaultdict(list)
+        for location, conf in extra_conf:
+            buckets[len(location)].append(conf)
+        return [
+            line for length in sorted(buckets, reverse=True)
+                for conf in buckets[length]
+                    for line in conf.split('\n')
+        ]
     
-    def render_virtual_host(self, site, context, ssl=False):
+    def render_virtual_host(self, site, context, directives, ssl=False):
         context.update({
             'port': self.HTTPS_PORT if ssl else self.HTTP_PORT,
             'vhost_set_fcgid': False,
-            'server_alias_lines': ' \\\n                '.join(context['server_alias'])
         })
-        context['extra_conf'] = self.get_extra_conf(site, context, ssl)
-        return Template(textwrap.dedent("""\
-            <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
-                IncludeOptional /etc/apache2/site[s]-override/{{ site_unique_name }}.con[f]
-                ServerName {{ server_name }}\
-            {% if server_alias %}
-                ServerAlias {{ server_alias_lines }}{% endif %}\
-            {% if access_log %}
-                CustomLog {{ access_log }} common{% endif %}\
-            {% if error_log %}
-                ErrorLog {{ error_log }}{% endif %}
-                SuexecUserGroup {{ user }} {{ group }}\
-            {% for line in extra_conf.splitlines %}
-                {{ line | safe }}{% endfor %}
-            </VirtualHost>
-            """)
-        ).render(Context(context))
+        context['extra_conf_lines'] = self.get_extra_conf_lines(site, context, directives, ssl)
+        lines = [
+            '<VirtualHost%s>' % context['vhost_ips_https' if ssl else 'vhost_ips_http'],
+            '    IncludeOptional /etc/apache2/site[s]-override/%(site_unique_name)s.con[f]' % context,
+            '    ServerName %s' % context['server_name'],
+        ]
+        if context['server_alias']:
+            lines.append('    ServerAlias %s' % context['server_alias_lines'])
+        if context['access_log']:
+            lines.append('    CustomLog %s common' % context['access_log'])
+        if context['error_log']:
+            lines.append('    ErrorLog %s' % context['error_log'])
+        lines.append('    SuexecUserGroup %s %s' % (context['user'], context['group']))
+        lines.extend('    %s' % line for line in context['extra_conf_lines'])
+        lines.extend((
+            '</VirtualHost>',
+            '',
+        ))
+        return '\n'.join(lines)
     
     def render_redirect_https(self, context):
-        context['port'] = self.HTTP_PORT
-        return Template(textwrap.dedent("""
-            <VirtualHost{% for ip in ips %} {{ ip }}:{{ port }}{% endfor %}>
-                ServerName {{ server_name }}\
-            {% if server_alias %}
-                ServerAlias {{ server_alias|join:' ' }}{% endif %}\
-            {% if access_log %}
-                CustomLog {{ access_log }} common{% endif %}\
-            {% if error_log %}
-                ErrorLog {{ error_log }}{% endif %}
-                RewriteEngine On
-                RewriteCond %{HTTPS} off
-                RewriteRule (.*) https://%{HTTP_HOST}%{REQUEST_URI}
-            </VirtualHost>
-            """)
-        ).render(Context(context))
+        """ static vhost, plain string formatting is enough """
+        lines = [
+            '',
+            '<VirtualHost%(vhost_ips_http)s>' % context,
+            '    ServerName %s' % context['server_name'],
+        ]
+        if context['server_alias']:
+            lines.append('    ServerAlias %s' % ' '.join(context['server_alias']))
+        if context['access_log']:
+            lines.append('    CustomLog %s common' % context['access_log'])
+        if context['error_log']:
+            lines.append('    ErrorLog %s' % context['error_log'])
+        lines.extend((
+            '    RewriteEngine On',
+            '    RewriteCond %{HTTPS} off',
+            '    RewriteRule (.*) https://%{HTTP_HOST}%{REQUEST_URI}',
+            '</VirtualHost>',
+            '',
+        ))
+        return '\n'.join(lines)
     
     def save(self, site):
         context = self.get_context(site)
         if context['server_name']:
-            apache_conf = '# %(banner)s\n' % context
+            # shared by HTTP and HTTPS vhosts
+            directives = site.get_directives()
+            context.update({
+                'vhost_ips_http': ''.join(' %s:%s' % (ip, self.HTTP_PORT) for ip in context['ips']),
+                'vhost_ips_https': ''.join(' %s:%s' % (ip, self.HTTPS_PORT) for ip in context['ips']),
+            })
+            vhosts = ['# %(banner)s\n' % context]
             if site.protocol in (site.HTTP, site.HTTP_AND_HTTPS):
-                apache_conf += self.render_virtual_host(site, context, ssl=False)
+                vhosts.append(self.render_virtual_host(site, context, directives, ssl=False))
             if site.protocol in (site.HTTP_AND_HTTPS, site.HTTPS_ONLY, site.HTTPS):
-                apache_conf += self.render_virtual_host(site, context, ssl=True)
+                vhosts.append(self.render_virtual_host(site, context, directives, ssl=True))
             if site.protocol == site.HTTPS_ONLY:
-                apache_conf += self.render_redirect_https(context)
-            context['apache_conf'] = apache_conf.strip()
-            self.append(textwrap.dedent("""
-                # Generate Apache config for site %(site_name)s
-                read -r -d '' apache_conf << 'EOF' || true
-                %(apache_conf)s
-                EOF
-                {
-                    echo -e "${apache_conf}" | diff -N -I'^\s*#' %(sites_available)s -
-                } || {
-                    echo -e "${apache_conf}" > %(sites_available)s
-                    UPDATED_APACHE=1
-                }""") % context
-            )
+                vhosts.append(self.render_redirect_https(context))
+            context['apache_conf'] = ''.join(vhosts).strip()
+            self.append(_SAVE_CONF_TMPL % context)
         if context['server_name'] and site.active:
-            self.append(textwrap.dedent("""
-                # Enable site %(site_name)s
-                [[ $(a2ensite %(site_unique_name)s) =~ "already enabled" ]] || UPDATED_APACHE=1\
-                """) % context
-            )
+            self.append(_ENABLE_SITE_TMPL % context)
         else:
-            self.append(textwrap.dedent("""
-                # Disable site %(site_name)s
-                [[ $(a2dissite %(site_unique_name)s) =~ "already disabled" ]] || UPDATED_APACHE=1\
-                """) % context
-            )
+            self.append(_DISABLE_SITE_TMPL % context)
     
     def delete(self, site):
         context = self.get_context(site)
-        self.append(textwrap.dedent("""
-            # Remove site configuration for %(site_name)s
-            [[ $(a2dissite %(site_unique_name)s) =~ "already disabled" ]] || UPDATED_APACHE=1
-            rm -f %(sites_available)s\
-            """) % context
-        )
+        self.append(_DELETE_TMPL % context)
     
     def prepare(self):
         super(Apache2Controller, self).prepare()
         # Coordinate apache restart with php backend in order not to overdo it
-        self.append(textwrap.dedent("""
-            BACKEND="Apache2Controller"
-            echo "$BACKEND" >> /dev/shm/reload.apache2
-            
-            function coordinate_apache_reload () {
-                # Coordinate Apache reload with other concurrent backends (e.g. PHPController)
-                is_last=0
-                counter=0
-                while ! mv /dev/shm/reload.apache2 /dev/shm/reload.apache2.locked; do
-                    if [[ $counter -gt 4 ]]; then
-                        echo "[ERROR]: Apache reload synchronization deadlocked!" >&2
-                        exit 10
-                    fi
-                    counter=$(($counter+1))
-                    sleep 0.1;
-                done
-                state="$(grep -v -E "^$BACKEND($|\s)" /dev/shm/reload.apache2.locked)" || is_last=1
-                [[ $is_last -eq 0 ]] && {
-                    echo "$state" | grep -v ' RELOAD$' || is_last=1
-                }
-                if [[ $is_last -eq 1 ]]; then
-                    echo "[DEBUG]: Last backend to run, update: $UPDATED_APACHE, state: '$state'"
-                    if [[ $UPDATED_APACHE -eq 1 || "$state" =~ .*RELOAD$ ]]; then
-                        if service apache2 status > /dev/null; then
-                            service apache2 reload
-                        else
-                            service apache2 start
-                        fi
-                    fi
-                    rm /dev/shm/reload.apache2.locked
-                else
-                    echo "$state" > /dev/shm/reload.apache2.locked
-                    if [[ $UPDATED_APACHE -eq 1 ]]; then
-                        echo -e "[DEBUG]: Apache will be reloaded by another backend:\\n${state}"
-                        echo "$BACKEND RELOAD" >> /dev/shm/reload.apache2.locked
-                    fi
-                    mv /dev/shm/reload.apache2.locked /dev/shm/reload.apache2
-                fi
-            }""")
-        )
+        self.append(_PREPARE_TMPL)
     
     def commit(self):
         """ reload Apache2 if necessary """
@@ -201,14 +311,16 @@ class Apache2Controller(ServiceController):
     
     def get_content_directives(self, site, context):
         directives = []
-        for content in site.content_set.all():
+        # webapp types read the account main systemuser for their directive context
+        contents = site.content_set.select_related('webapp__account__main_systemuser')
+        for content in contents:
             directive = content.webapp.get_directive()
             self.set_content_context(content, context)
             directives += self.get_directives(directive, context)
         return directives
     
     def get_static_directives(self, context, app_path):
-        context['app_path'] = os.path.normpath(app_path % context)
+        context['app_path'] = _normpath(app_path % context)
         directive = self.get_location_filesystem_map(context)
         return [
             (context['location'], directive),
@@ -230,19 +342,20 @@ class Apache2Controller(ServiceController):
                 # FIXME unix sockets do not support $1
                 target = 'unix:%(socket)s|fcgi://127.0.0.1%(app_path)s/$1'
         context.update({
-            'app_path': os.path.normpath(app_path),
+            'app_path': _normpath(app_path),
             'socket': socket,
         })
-        directives = "ProxyPassMatch ^%(location)s/(.*\.php(/.*)?)$ {target}\n".format(target=target) % context
+        directives = ("ProxyPassMatch ^%(location)s/(.*\.php(/.*)?)$ " + target + "\n") % context
         directives += self.get_location_filesystem_map(context)
         return [
             (context['location'], directives),
         ]
     
     def get_fcgid_directives(self, context, app_path, wrapper_path):
+        wrapper_dir, wrapper_name = _splitpath(wrapper_path)
         context.update({
-            'app_path': os.path.normpath(app_path),
-            'wrapper_name': os.path.basename(wrapper_path),
+            'app_path': _normpath(app_path),
+            'wrapper_name': wrapper_name,
         })
         directives = ''
         # This Action trick is used instead of FcgidWrapper because we don't want to define
@@ -250,22 +363,11 @@ class Apache2Controller(ServiceController):
         if not context['vhost_set_fcgid']:
             # fcgi-bin only needs to be defined once per vhots
             # We assume that all account wrapper paths will share the same dir
-            context['wrapper_dir'] = os.path.dirname(wrapper_path)
+            context['wrapper_dir'] = wrapper_dir
             context['vhost_set_fcgid'] = True
-            directives = textwrap.dedent("""\
-                Alias /fcgi-bin/ %(wrapper_dir)s/
-                <Location /fcgi-bin/>
-                    SetHandler fcgid-script
-                    Options +ExecCGI
-                </Location>
-                """) % context
+            directives = _FCGID_BIN_TMPL % context
         directives += self.get_location_filesystem_map(context)
-        directives += textwrap.dedent("""
-            ProxyPass %(location)s/ !
-            <Directory %(app_path)s/>
-                AddHandler php-fcgi .php
-                Action php-fcgi /fcgi-bin/%(wrapper_name)s
-            </Directory>""") % context
+        directives += _FCGID_APP_TMPL % context
         return [
             (context['location'], directives),
         ]
@@ -310,17 +412,10 @@ class Apache2Controller(ServiceController):
             if location == '/':
                 rules.append('SecRuleEngine Off')
             else:
-                rules.append(textwrap.dedent("""\
-                    <Location %s>
-                        SecRuleEngine Off
-                    </Location>""") % location
-                )
+                rules.append(_SEC_ENGINE_LOCATION_TMPL % location)
         security = []
         if rules:
-            rules = textwrap.dedent("""\
-                <IfModule mod_security2.c>
-                    %s
-                </IfModule>""") % '\n    '.join(rules)
+            rules = _SECURITY_TMPL % '\n    '.join(rules)
             security.append((location, rules))
         return security
     
@@ -328,7 +423,7 @@ class Apache2Controller(ServiceController):
         redirects = []
         for redirect in directives.get('redirect', []):
             location, target = redirect.split()
-            if re.match(r'^.*[\^\*\$\?\)]+.*$', redirect):
+            if _REDIRECT_REGEX_CHARS.search(redirect):
                 redirect = "RedirectMatch %s %s" % (location, target)
             else:
                 redirect = "Redirect %s %s" % (location, target)
@@ -345,11 +440,7 @@ class Apache2Controller(ServiceController):
             target = proxy[1]
             options = ' '.join(proxy[2:])
             location = normurlpath(location)
-            proxy = textwrap.dedent("""\
-                ProxyPass {location}/ {target} {options}
-                ProxyPassReverse {location}/ {target}""".format(
-                    location=location, target=target, options=options)
-            )
+            proxy = _PROXY_TMPL.format(location=location, target=target, options=options)
             proxies.append(
                 (location, proxy)
             )
@@ -381,13 +472,17 @@ class Apache2Controller(ServiceController):
         return site.get_groupname()
     
     def get_server_names(self, site):
+        if 'domains' in getattr(site, '_prefetched_objects_cache', ()):
+            names = sorted(domain.name for domain in site.domains.all())
+        else:
+            names = site.domains.order_by('name').values_list('name', flat=True)
         server_name = None
         server_alias = []
-        for domain in site.domains.all().order_by('name'):
-            if not server_name and not domain.name.startswith('*'):
-                server_name = domain.name
+        for name in names:
+            if not server_name and not name.startswith('*'):
+                server_name = name
             else:
-                server_alias.append(domain.name)
+                server_alias.append(name)
         return server_name, server_alias
     
     def get_context(self, site):
@@ -404,6 +499,7 @@ class Apache2Controller(ServiceController):
             'group': self.get_groupname(site),
             'server_name': server_name,
             'server_alias': server_alias,
+            'server_alias_lines': ' \\\n                '.join(server_alias),
             'sites_enabled': "%s.conf" % os.path.join(sites_enabled, site.unique_name),
             'sites_available': "%s.conf" % os.path.join(sites_available, site.unique_name),
             'access_log': site.get_www_access_log_path(),
@@ -439,51 +535,13 @@ class Apache2Traffic(ServiceMonitor):
     
     def prepare(self):
         super(Apache2Traffic, self).prepare()
-        ignore_hosts = '\\|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)
+        # Filtered inside awk as an ERE alternation, no extra grep process
+        ignore_hosts = '|'.join(settings.WEBSITES_TRAFFIC_IGNORE_HOSTS)
         context = {
             'current_date': self.current_date.strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'ignore_hosts': '-v "%s"' % ignore_hosts if ignore_hosts else '',
+            'ignore_hosts': ignore_hosts,
         }
-        self.append(textwrap.dedent("""\
-            function monitor () {
-                OBJECT_ID=$1
-                INI_DATE=$(date "+%%Y%%m%%d%%H%%M%%S" -d "$2")
-                END_DATE=$(date '+%%Y%%m%%d%%H%%M%%S' -d '%(current_date)s')
-                LOG_FILE="$3"
-                {
-                    { grep %(ignore_hosts)s ${LOG_FILE} || echo -e '\\r'; } \\
-                        | awk -v ini="${INI_DATE}" -v end="${END_DATE}" '
-                            BEGIN {
-                                sum = 0
-                                months["Jan"] = "01"
-                                months["Feb"] = "02"
-                                months["Mar"] = "03"
-                                months["Apr"] = "04"
-                                months["May"] = "05"
-                                months["Jun"] = "06"
-                                months["Jul"] = "07"
-                                months["Aug"] = "08"
-                                months["Sep"] = "09"
-                                months["Oct"] = "10"
-                                months["Nov"] = "11"
-                                months["Dec"] = "12"
-                            } {
-                                # date = [11/Jul/2014:13:50:41
-                                date = substr($4, 2)
-                                year = substr(date, 8, 4)
-                                month = months[substr(date, 4, 3)];
-                                day = substr(date, 1, 2)
-                                hour = substr(date, 13, 2)
-                                minute = substr(date, 16, 2)
-                                second = substr(date, 19, 2)
-                                line_date = year month day hour minute second
-                                if ( line_date > ini && line_date < end)
-                                    sum += $NF
-                            } END {
-                                print sum
-                            }' || [[ $? == 1 ]] && true
-                } | xargs echo ${OBJECT_ID}
-            }""") % context)
+        self.append(_MONITOR_TMPL % context)
     
     def monitor(self, site):
         context = self.get_context(site)
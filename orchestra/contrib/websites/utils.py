@@ -1,3 +1,7 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
 def normurlpath(path):
     if not path.startswith('/'):
         path = '/' + path